@@ -4,202 +4,264 @@
 Script d'analyse du fichier CM.json pour vérifier la complétude des données
 """
 
+import io
 import json
+import sys
 from pathlib import Path
-from collections import Counter, defaultdict
-from typing import Dict, List, Any
+from types import MappingProxyType
+from collections import Counter
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Tuple
 
-# Mapping des codes administratifs du Cameroun
-CAMEROON_REGIONS = {
-    "00": "Non spécifié",
-    "01": "Adamaoua",
-    "02": "Centre",
-    "03": "Est",
-    "04": "Extrême-Nord",
-    "05": "Littoral",
-    "06": "Nord",
-    "07": "Nord-Ouest",
-    "08": "Ouest",
-    "09": "Sud",
-    "10": "Sud-Ouest",
-    "11": "Est (alternatif)",
-    "12": "Nord (alternatif)",
-    "13": "Nord-Ouest (alternatif)",
-    "14": "Centre (alternatif)"
+try:
+    import ijson  # Lecture JSON en flux (optionnelle, backend C choisi automatiquement)
+except ImportError:
+    ijson = None
+
+# Dictionnaire vide partagé (lecture seule) pour les clés absentes
+_EMPTY = MappingProxyType({})
+
+# Noms des régions du Cameroun, indexés par code administratif ("00" à "14")
+CAMEROON_REGIONS = (
+    "Non spécifié",             # 00
+    "Adamaoua",                 # 01
+    "Centre",                   # 02
+    "Est",                      # 03
+    "Extrême-Nord",             # 04
+    "Littoral",                 # 05
+    "Nord",                     # 06
+    "Nord-Ouest",               # 07
+    "Ouest",                    # 08
+    "Sud",                      # 09
+    "Sud-Ouest",                # 10
+    "Est (alternatif)",         # 11
+    "Nord (alternatif)",        # 12
+    "Nord-Ouest (alternatif)",  # 13
+    "Centre (alternatif)",      # 14
+)
+
+# Feature codes pour villes et quartiers (frozenset pour des tests d'appartenance en O(1))
+POPULATED_PLACES = frozenset(["PPL", "PPLA", "PPLA2", "PPLA3", "PPLA4", "PPLC", "PPLF", "PPLG", "PPLH", "PPLL", "PPLQ", "PPLR", "PPLS", "PPLW", "PPLX"])
+CITIES = frozenset(["PPLA", "PPLA2", "PPLA3", "PPLA4", "PPLC"])  # Capitales et grandes villes
+NEIGHBORHOODS = frozenset(["PPLX", "PPLQ"])  # Quartiers et subdivisions
+
+# Labels des types géographiques
+FEATURE_TYPE_LABELS = {
+    'P': 'Lieux habités',
+    'H': 'Hydrographie',
+    'T': 'Topographie',
+    'A': 'Zones administratives',
+    'S': 'Zones de peuplement',
+    'L': 'Zones de végétation',
+    'V': 'Zones de végétation',
+    'R': 'Routes',
+    'U': 'Zones urbaines'
 }
 
-# Feature codes pour villes et quartiers
-POPULATED_PLACES = ["PPL", "PPLA", "PPLA2", "PPLA3", "PPLA4", "PPLC", "PPLF", "PPLG", "PPLH", "PPLL", "PPLQ", "PPLR", "PPLS", "PPLW", "PPLX"]
-CITIES = ["PPLA", "PPLA2", "PPLA3", "PPLA4", "PPLC"]  # Capitales et grandes villes
-NEIGHBORHOODS = ["PPLX", "PPLQ"]  # Quartiers et subdivisions
+# Labels des codes de caractéristiques
+FEATURE_CODE_LABELS = {
+    'PPL': 'Lieu habité',
+    'PPLA': 'Capitale de région',
+    'PPLA2': 'Capitale de département',
+    'PPLA3': 'Capitale d\'arrondissement',
+    'PPLA4': 'Capitale de localité',
+    'PPLC': 'Capitale de pays',
+    'PPLX': 'Quartier/Subdivision',
+    'PPLQ': 'Quartier',
+    'STM': 'Cours d\'eau',
+    'STMI': 'Cours d\'eau intermittent',
+    'HLL': 'Colline',
+    'MT': 'Montagne'
+}
+
+def get_region_name(code: str) -> str:
+    """Retourne le nom de la région correspondant à un code administratif"""
+    if len(code) == 2 and code.isascii() and code.isdigit():
+        index = int(code)
+        if index < len(CAMEROON_REGIONS):
+            return CAMEROON_REGIONS[index]
+    return f"Code inconnu: {code}"
+
+def _stream_locations(file_path: Path) -> Iterator[Dict[str, Any]]:
+    """Itère sur les lieux du fichier sans le charger entièrement en mémoire"""
+    with open(file_path, 'rb') as f:
+        yield from ijson.items(f, 'locations.item', use_float=True)
+
+def load_cm_file(file_path: Path) -> Tuple[Dict[str, Any], Iterable[Dict[str, Any]]]:
+    """Retourne les métadonnées et les lieux du fichier CM.json"""
+    if ijson is None:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('metadata', {}), data.get('locations', [])
+    
+    # Les métadonnées sont en tête de fichier : seul le début est lu ici
+    with open(file_path, 'rb') as f:
+        metadata = next(ijson.items(f, 'metadata', use_float=True), {})
+    return metadata, _stream_locations(file_path)
 
 def analyze_cm_file(file_path: Path) -> Dict[str, Any]:
     """Analyse complète du fichier CM.json"""
     
-    print(f"📊 Analyse du fichier: {file_path}")
-    print("=" * 80)
-    
-    # Charger le fichier JSON
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # Le rapport est construit en mémoire puis écrit sur stdout en une seule fois
+    buf = io.StringIO()
+    p = buf.write
+    try:
+        return _analyze(file_path, p)
+    finally:
+        sys.stdout.write(buf.getvalue())
+
+def _analyze(file_path: Path, p: Callable[[str], Any]) -> Dict[str, Any]:
+    """Calcule les statistiques du fichier et écrit le rapport via p"""
     
-    locations = data.get('locations', [])
-    metadata = data.get('metadata', {})
+    p(f"📊 Analyse du fichier: {file_path}\n")
+    p("=" * 80 + "\n")
     
-    print(f"\n✅ Métadonnées:")
-    print(f"   - Total déclaré: {metadata.get('total_locations', 0)}")
-    print(f"   - Total réel: {len(locations)}")
-    print(f"   - Source: {metadata.get('source', 'N/A')}")
-    print(f"   - Généré le: {metadata.get('generated_at', 'N/A')}")
+    # Charger le fichier JSON (les lieux sont lus en flux si ijson est disponible)
+    metadata, locations = load_cm_file(file_path)
     
-    # Statistiques par région
-    print(f"\n📍 Distribution par région:")
-    region_stats = Counter()
-    region_by_type = defaultdict(lambda: defaultdict(int))
+    # Parcours unique des lieux : extraction des colonnes utiles (région, code
+    # et type) en listes parallèles et mise à jour des compteurs de complétude
+    region_codes = []
+    feature_codes = []
+    feature_types = []
+    locations_with_coords = 0
+    locations_with_names = 0
+    locations_with_region = 0
     
     for loc in locations:
-        admin = loc.get('administrative', {})
+        feature = loc.get('feature') or _EMPTY
+        admin = loc.get('administrative') or _EMPTY
+        coordinates = loc.get('coordinates') or _EMPTY
         region_code = admin.get('level_1', '00')
-        region_name = CAMEROON_REGIONS.get(region_code, f"Code inconnu: {region_code}")
-        region_stats[region_code] += 1
+        feature_code = feature.get('code', '')
+        
+        region_codes.append(region_code)
+        feature_codes.append(feature_code)
+        feature_types.append(feature.get('type', ''))
         
-        feature_code = loc.get('feature', {}).get('code', '')
-        region_by_type[region_code][feature_code] += 1
+        if coordinates.get('latitude') and coordinates.get('longitude'):
+            locations_with_coords += 1
+        if (loc.get('names') or _EMPTY).get('primary'):
+            locations_with_names += 1
+        if admin.get('level_1'):
+            locations_with_region += 1
     
-    for code, count in sorted(region_stats.items()):
-        region_name = CAMEROON_REGIONS.get(code, f"Code inconnu: {code}")
-        print(f"   - {region_name} ({code}): {count:,} lieux")
+    total_locations = len(region_codes)
     
-    # Statistiques par type de lieu
-    print(f"\n🏘️  Distribution par type de lieu:")
+    # Répartition (région, code) dans un Counter plat indexé par tuple : les
+    # statistiques par région et par code en sont dérivées en parcourant les
+    # quelques centaines de couples distincts plutôt que tous les lieux
+    region_by_type = Counter(zip(region_codes, feature_codes))
+    region_stats = Counter()
     feature_stats = Counter()
-    feature_type_stats = Counter()
+    cities_by_region = Counter()
+    neighborhoods_by_region = Counter()
+    for (region_code, feature_code), count in region_by_type.items():
+        region_stats[region_code] += count
+        feature_stats[feature_code] += count
+        if feature_code in CITIES:
+            cities_by_region[region_code] += count
+        elif feature_code in NEIGHBORHOODS:
+            neighborhoods_by_region[region_code] += count
     
-    for loc in locations:
-        feature = loc.get('feature', {})
-        feature_type = feature.get('type', '')
-        feature_code = feature.get('code', '')
-        feature_stats[feature_code] += 1
-        feature_type_stats[feature_type] += 1
+    # Villes, quartiers et lieux habités : simples totaux, sans matérialiser de
+    # listes ni tester l'appartenance pour chaque lieu
+    cities_count = sum(cities_by_region.values())
+    neighborhoods_count = sum(neighborhoods_by_region.values())
+    populated_count = sum(count for code, count in feature_stats.items() if code in POPULATED_PLACES)
+    
+    p(f"\n✅ Métadonnées:\n")
+    p(f"   - Total déclaré: {metadata.get('total_locations', 0)}\n")
+    p(f"   - Total réel: {total_locations}\n")
+    p(f"   - Source: {metadata.get('source', 'N/A')}\n")
+    p(f"   - Généré le: {metadata.get('generated_at', 'N/A')}\n")
+    
+    # Statistiques par région
+    p(f"\n📍 Distribution par région:\n")
+    for code, count in sorted(region_stats.items()):
+        region_name = get_region_name(code)
+        p(f"   - {region_name} ({code}): {count:,} lieux\n")
+    
+    # Statistiques par type de lieu
+    p(f"\n🏘️  Distribution par type de lieu:\n")
+    feature_type_stats = Counter(feature_types)
     
-    print(f"\n   Par type géographique:")
+    p(f"\n   Par type géographique:\n")
     for ftype, count in sorted(feature_type_stats.items()):
-        type_label = {
-            'P': 'Lieux habités',
-            'H': 'Hydrographie',
-            'T': 'Topographie',
-            'A': 'Zones administratives',
-            'S': 'Zones de peuplement',
-            'L': 'Zones de végétation',
-            'V': 'Zones de végétation',
-            'R': 'Routes',
-            'U': 'Zones urbaines'
-        }.get(ftype, f"Type {ftype}")
-        print(f"      - {type_label} ({ftype}): {count:,}")
-    
-    print(f"\n   Par code de caractéristique (Top 20):")
+        type_label = FEATURE_TYPE_LABELS.get(ftype, f"Type {ftype}")
+        p(f"      - {type_label} ({ftype}): {count:,}\n")
+    
+    p(f"\n   Par code de caractéristique (Top 20):\n")
     for code, count in feature_stats.most_common(20):
-        code_label = {
-            'PPL': 'Lieu habité',
-            'PPLA': 'Capitale de région',
-            'PPLA2': 'Capitale de département',
-            'PPLA3': 'Capitale d\'arrondissement',
-            'PPLA4': 'Capitale de localité',
-            'PPLC': 'Capitale de pays',
-            'PPLX': 'Quartier/Subdivision',
-            'PPLQ': 'Quartier',
-            'STM': 'Cours d\'eau',
-            'STMI': 'Cours d\'eau intermittent',
-            'HLL': 'Colline',
-            'MT': 'Montagne'
-        }.get(code, code)
-        print(f"      - {code_label} ({code}): {count:,}")
+        code_label = FEATURE_CODE_LABELS.get(code, code)
+        p(f"      - {code_label} ({code}): {count:,}\n")
     
     # Analyse des villes et quartiers
-    print(f"\n🏙️  Analyse des villes et quartiers:")
-    cities = [loc for loc in locations if loc.get('feature', {}).get('code', '') in CITIES]
-    neighborhoods = [loc for loc in locations if loc.get('feature', {}).get('code', '') in NEIGHBORHOODS]
-    all_populated = [loc for loc in locations if loc.get('feature', {}).get('code', '') in POPULATED_PLACES]
-    
-    print(f"   - Villes principales (PPLA, PPLA2, etc.): {len(cities):,}")
-    print(f"   - Quartiers (PPLX, PPLQ): {len(neighborhoods):,}")
-    print(f"   - Tous les lieux habités: {len(all_populated):,}")
+    p(f"\n🏙️  Analyse des villes et quartiers:\n")
+    p(f"   - Villes principales (PPLA, PPLA2, etc.): {cities_count:,}\n")
+    p(f"   - Quartiers (PPLX, PPLQ): {neighborhoods_count:,}\n")
+    p(f"   - Tous les lieux habités: {populated_count:,}\n")
     
     # Vérification de la complétude
-    print(f"\n✅ Vérification de la complétude:")
+    p(f"\n✅ Vérification de la complétude:\n")
     
     # Vérifier les 10 régions principales
     main_regions = ["01", "02", "03", "04", "05", "06", "07", "08", "09", "10"]
     missing_regions = []
     for code in main_regions:
         if code not in region_stats:
-            missing_regions.append(CAMEROON_REGIONS[code])
+            missing_regions.append(get_region_name(code))
     
     if missing_regions:
-        print(f"   ⚠️  Régions manquantes: {', '.join(missing_regions)}")
+        p(f"   ⚠️  Régions manquantes: {', '.join(missing_regions)}\n")
     else:
-        print(f"   ✅ Toutes les 10 régions principales sont présentes")
+        p(f"   ✅ Toutes les 10 régions principales sont présentes\n")
     
     # Vérifier les données essentielles
-    locations_with_coords = sum(1 for loc in locations if loc.get('coordinates', {}).get('latitude') and loc.get('coordinates', {}).get('longitude'))
-    locations_with_names = sum(1 for loc in locations if loc.get('names', {}).get('primary'))
-    locations_with_region = sum(1 for loc in locations if loc.get('administrative', {}).get('level_1'))
-    
-    print(f"   - Lieux avec coordonnées: {locations_with_coords:,} / {len(locations):,} ({locations_with_coords/len(locations)*100:.1f}%)")
-    print(f"   - Lieux avec nom: {locations_with_names:,} / {len(locations):,} ({locations_with_names/len(locations)*100:.1f}%)")
-    print(f"   - Lieux avec région: {locations_with_region:,} / {len(locations):,} ({locations_with_region/len(locations)*100:.1f}%)")
+    p(f"   - Lieux avec coordonnées: {locations_with_coords:,} / {total_locations:,} ({locations_with_coords/total_locations*100:.1f}%)\n")
+    p(f"   - Lieux avec nom: {locations_with_names:,} / {total_locations:,} ({locations_with_names/total_locations*100:.1f}%)\n")
+    p(f"   - Lieux avec région: {locations_with_region:,} / {total_locations:,} ({locations_with_region/total_locations*100:.1f}%)\n")
     
     # Statistiques par région pour les villes
-    print(f"\n🏙️  Villes par région:")
-    cities_by_region = defaultdict(int)
-    for city in cities:
-        region_code = city.get('administrative', {}).get('level_1', '00')
-        cities_by_region[region_code] += 1
-    
+    p(f"\n🏙️  Villes par région:\n")
     for code in sorted(cities_by_region.keys()):
-        region_name = CAMEROON_REGIONS.get(code, f"Code inconnu: {code}")
-        print(f"   - {region_name} ({code}): {cities_by_region[code]} villes")
+        region_name = get_region_name(code)
+        p(f"   - {region_name} ({code}): {cities_by_region[code]} villes\n")
     
     # Quartiers par région
-    print(f"\n🏘️  Quartiers par région:")
-    neighborhoods_by_region = defaultdict(int)
-    for neighborhood in neighborhoods:
-        region_code = neighborhood.get('administrative', {}).get('level_1', '00')
-        neighborhoods_by_region[region_code] += 1
-    
+    p(f"\n🏘️  Quartiers par région:\n")
     for code in sorted(neighborhoods_by_region.keys()):
-        region_name = CAMEROON_REGIONS.get(code, f"Code inconnu: {code}")
-        print(f"   - {region_name} ({code}): {neighborhoods_by_region[code]} quartiers")
+        region_name = get_region_name(code)
+        p(f"   - {region_name} ({code}): {neighborhoods_by_region[code]} quartiers\n")
     
     # Résumé final
-    print(f"\n" + "=" * 80)
-    print(f"📊 RÉSUMÉ FINAL:")
-    print(f"   ✅ Total de lieux: {len(locations):,}")
-    print(f"   ✅ Villes principales: {len(cities):,}")
-    print(f"   ✅ Quartiers: {len(neighborhoods):,}")
-    print(f"   ✅ Lieux habités: {len(all_populated):,}")
-    print(f"   ✅ Régions couvertes: {len(region_stats)}")
+    p("\n" + "=" * 80 + "\n")
+    p(f"📊 RÉSUMÉ FINAL:\n")
+    p(f"   ✅ Total de lieux: {total_locations:,}\n")
+    p(f"   ✅ Villes principales: {cities_count:,}\n")
+    p(f"   ✅ Quartiers: {neighborhoods_count:,}\n")
+    p(f"   ✅ Lieux habités: {populated_count:,}\n")
+    p(f"   ✅ Régions couvertes: {len(region_stats)}\n")
     
     # Recommandation
-    print(f"\n💡 RECOMMANDATION:")
-    if len(locations) >= 24000 and len(cities) > 0 and len(neighborhoods) > 0:
-        print(f"   ✅ Le scraping peut être considéré comme TERMINÉ")
-        print(f"   ✅ Les données sont complètes et utilisables")
-        print(f"   ✅ Structure JSON appropriée pour intégration dans le projet")
+    p(f"\n💡 RECOMMANDATION:\n")
+    if total_locations >= 24000 and cities_count > 0 and neighborhoods_count > 0:
+        p(f"   ✅ Le scraping peut être considéré comme TERMINÉ\n")
+        p(f"   ✅ Les données sont complètes et utilisables\n")
+        p(f"   ✅ Structure JSON appropriée pour intégration dans le projet\n")
     else:
-        print(f"   ⚠️  Le scraping nécessite des compléments")
-        if len(cities) == 0:
-            print(f"      - Aucune ville principale trouvée")
-        if len(neighborhoods) == 0:
-            print(f"      - Aucun quartier trouvé")
+        p(f"   ⚠️  Le scraping nécessite des compléments\n")
+        if cities_count == 0:
+            p(f"      - Aucune ville principale trouvée\n")
+        if neighborhoods_count == 0:
+            p(f"      - Aucun quartier trouvé\n")
     
     return {
-        'total_locations': len(locations),
-        'cities': len(cities),
-        'neighborhoods': len(neighborhoods),
-        'populated_places': len(all_populated),
+        'total_locations': total_locations,
+        'cities': cities_count,
+        'neighborhoods': neighborhoods_count,
+        'populated_places': populated_count,
         'regions': len(region_stats),
-        'is_complete': len(locations) >= 24000 and len(cities) > 0
+        'is_complete': total_locations >= 24000 and cities_count > 0
     }
 
 if __name__ == '__main__':
@@ -4,31 +4,76 @@
 import csv
 import json
 import os
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any
+from types import MappingProxyType
+from datetime import datetime
+from typing import Dict, Any, List
+
+try:
+    import orjson  # Sérialisation JSON rapide (optionnelle)
+except ImportError:
+    orjson = None
 
 # Chemins des fichiers
 script_dir = Path(__file__).parent
 input_file = script_dir.parent / 'CM.csv'
 output_file = script_dir.parent / 'CM.json'
+# Fichier intermédiaire renommé en CM.json une fois la conversion terminée
+temp_file = script_dir.parent / 'CM.json.tmp'
+
+# Tampons de lecture/écriture (1 Mo) et place réservée pour total_locations
+READ_BUFFER_SIZE = 1 << 20
+WRITE_BUFFER_SIZE = 1 << 20
+TOTAL_PLACEHOLDER = b' ' * 12
+
+# Dictionnaire vide partagé (lecture seule) pour les clés absentes
+_EMPTY = MappingProxyType({})
+
+# Labels des types et codes de caractéristiques GeoNames
+FEATURE_TYPE_LABELS = {
+    'P': 'Populated place',
+    'H': 'Hydrographic',
+    'T': 'Topographic'
+}
+
+FEATURE_CODE_LABELS = {
+    'PPL': 'Populated Place',
+    'STM': 'Stream',
+    'STMI': 'Intermittent Stream',
+    'HLL': 'Hill',
+    'MT': 'Mountain',
+    'LK': 'Lake',
+    'RESV': 'Reservoir',
+    'ISL': 'Island',
+    'PPLA': 'Seat of a first-order administrative division',
+    'PPLA2': 'Seat of a second-order administrative division',
+    'PPLA3': 'Seat of a third-order administrative division',
+    'PPLA4': 'Seat of a fourth-order administrative division',
+    'PPLC': 'Capital of a political entity',
+}
 
 print('Lecture du fichier CM.csv...')
 
 def clean_value(value: str) -> Any:
     """Nettoie et convertit les valeurs"""
-    if not value or value.strip() == '':
+    if not value:
+        return None
+    value = value.strip()
+    if not value:
         return None
     
-    # Essayer de convertir en nombre si possible
-    try:
-        # Vérifier si c'est un nombre décimal
-        if '.' in value:
-            return float(value)
-        # Vérifier si c'est un entier
-        return int(value)
-    except ValueError:
-        # Retourner la chaîne telle quelle
-        return value.strip()
+    # Ne tenter la conversion que si la valeur peut être un nombre, pour éviter
+    # de lever une ValueError sur chaque texte (noms alternatifs notamment)
+    first = value[0]
+    if first.isdigit() or first in '+-.':
+        try:
+            if '.' in value:
+                return float(value)
+            return int(value)
+        except ValueError:
+            pass
+    return value
 
 def parse_alternatives(alternatives_str: str) -> list:
     """Parse la chaîne d'alternatives en liste"""
@@ -37,64 +82,81 @@ def parse_alternatives(alternatives_str: str) -> list:
     
     return [alt.strip() for alt in alternatives_str.split(',') if alt.strip()]
 
-def create_location_object(row: Dict[str, str]) -> Dict[str, Any]:
-    """Crée un objet location structuré à partir d'une ligne CSV"""
+def create_location_object(row: List[str]) -> Dict[str, Any]:
+    """Crée un objet location structuré à partir d'une ligne CSV
+
+    Les colonnes sont lues par position via IDX (construit depuis l'en-tête).
+    """
     
     # Coordonnées
     coordinates = None
-    lat = clean_value(row.get('latitude', ''))
-    lng = clean_value(row.get('longitude', ''))
+    lat = clean_value(row[IDX['latitude']])
+    lng = clean_value(row[IDX['longitude']])
     if lat is not None and lng is not None:
         coordinates = {
             'latitude': lat,
             'longitude': lng
         }
     
-    # Noms
-    names = {
-        'primary': row.get('name_primary', '').strip(),
-        'alternate': clean_value(row.get('name_alternate', '')),
-        'alternatives': parse_alternatives(row.get('name_alternatives', ''))
-    }
+    # Noms (seules les valeurs présentes sont conservées)
+    name_primary = row[IDX['name_primary']].strip()
+    name_alternate = clean_value(row[IDX['name_alternate']])
+    name_alternatives = parse_alternatives(row[IDX['name_alternatives']])
+    
+    names = {'primary': name_primary}
+    all_names = [name_primary]
+    if name_alternate is not None:
+        names['alternate'] = name_alternate
+        if name_alternate:
+            all_names.append(name_alternate)
+    if name_alternatives:
+        names['alternatives'] = name_alternatives
+        all_names.extend(name_alternatives)
     
     # Tous les noms combinés
-    all_names = [names['primary']]
-    if names['alternate']:
-        all_names.append(names['alternate'])
-    all_names.extend(names['alternatives'])
-    names['all'] = list(set([n for n in all_names if n]))
+    all_names = list(dict.fromkeys(n for n in all_names if n))
+    if all_names:
+        names['all'] = all_names
     
     # Type géographique
-    feature = {
-        'type': row.get('feature_type', '').strip() or None,
-        'code': row.get('feature_code', '').strip() or None,
-        'type_label': get_feature_type_label(row.get('feature_type', '')),
-        'code_label': get_feature_code_label(row.get('feature_code', ''))
-    }
+    feature_type = row[IDX['feature_type']].strip()
+    feature_code = row[IDX['feature_code']].strip()
+    
+    feature = {}
+    if feature_type:
+        feature['type'] = feature_type
+    if feature_code:
+        feature['code'] = feature_code
+    type_label = get_feature_type_label(feature_type)
+    if type_label is not None:
+        feature['type_label'] = type_label
+    code_label = get_feature_code_label(feature_code)
+    if code_label is not None:
+        feature['code_label'] = code_label
     
     # Codes administratifs
     admin_codes = {}
     for i in range(1, 5):
-        code = row.get(f'admin_code_{i}', '').strip()
+        code = row[IDX[f'admin_code_{i}']].strip()
         if code:
             admin_codes[f'level_{i}'] = code
     
     # Élévation - vérifier si c'est un nombre valide
-    elevation_str = row.get('elevation', '').strip()
+    elevation_str = row[IDX['elevation']].strip()
     elevation = None
     if elevation_str:
         try:
             elevation = float(elevation_str)
             if elevation == 0:
                 # Si elevation est 0, vérifier si modification_date contient l'élévation
-                mod_date = row.get('modification_date', '').strip()
+                mod_date = row[IDX['modification_date']].strip()
                 if mod_date and mod_date.isdigit():
                     elevation = float(mod_date)
         except ValueError:
             pass
     
     # Population
-    population_str = row.get('population', '').strip()
+    population_str = row[IDX['population']].strip()
     population = None
     if population_str:
         try:
@@ -104,10 +166,10 @@ def create_location_object(row: Dict[str, str]) -> Dict[str, Any]:
             pass
     
     # Timezone
-    timezone = row.get('timezone', '').strip() or None
+    timezone = row[IDX['timezone']].strip() or None
     
     # Date de modification - peut être dans elevation ou modification_date
-    modification_date = row.get('modification_date', '').strip()
+    modification_date = row[IDX['modification_date']].strip()
     # Si modification_date ressemble à un nombre (c'est probablement l'élévation)
     if modification_date and modification_date.isdigit():
         # L'élévation était dans modification_date, chercher la vraie date ailleurs
@@ -115,86 +177,109 @@ def create_location_object(row: Dict[str, str]) -> Dict[str, Any]:
     elif not modification_date or modification_date == '':
         modification_date = None
     
-    # Structure finale
+    # Structure finale : on n'ajoute que les clés ayant une valeur
     location = {
-        'id': row.get('id', '').strip(),
-        'names': names,
-        'coordinates': coordinates,
-        'feature': feature,
-        'country': {
-            'code': row.get('country_code', '').strip() or None
-        },
-        'administrative': admin_codes if admin_codes else None,
-        'elevation': {
-            'meters': elevation
-        } if elevation is not None else None,
-        'population': population,
-        'timezone': timezone,
-        'metadata': {
-            'modification_date': modification_date
-        } if modification_date else {}
+        'id': row[IDX['id']].strip(),
+        'names': names
     }
+    if coordinates is not None:
+        location['coordinates'] = coordinates
+    if feature:
+        location['feature'] = feature
+    country_code = row[IDX['country_code']].strip()
+    if country_code:
+        location['country'] = {'code': country_code}
+    if admin_codes:
+        location['administrative'] = admin_codes
+    if elevation is not None:
+        location['elevation'] = {'meters': elevation}
+    if population is not None:
+        location['population'] = population
+    if timezone:
+        location['timezone'] = timezone
+    if modification_date:
+        location['metadata'] = {'modification_date': modification_date}
     
-    # Nettoyer les valeurs None
-    return clean_none_values(location)
-
-def clean_none_values(obj: Any) -> Any:
-    """Supprime récursivement les valeurs None des dictionnaires"""
-    if isinstance(obj, dict):
-        cleaned = {}
-        for key, value in obj.items():
-            cleaned_value = clean_none_values(value)
-            if cleaned_value is not None:
-                cleaned[key] = cleaned_value
-        return cleaned if cleaned else None
-    elif isinstance(obj, list):
-        cleaned = [clean_none_values(item) for item in obj if clean_none_values(item) is not None]
-        return cleaned if cleaned else None
-    else:
-        return obj
+    return location
 
+@lru_cache(maxsize=None)
 def get_feature_type_label(feature_type: str) -> str:
     """Retourne le label du type de caractéristique"""
-    labels = {
-        'P': 'Populated place',
-        'H': 'Hydrographic',
-        'T': 'Topographic'
-    }
-    return labels.get(feature_type.strip(), None)
+    return FEATURE_TYPE_LABELS.get(feature_type.strip(), None)
 
+@lru_cache(maxsize=None)
 def get_feature_code_label(feature_code: str) -> str:
     """Retourne le label du code de caractéristique"""
-    labels = {
-        'PPL': 'Populated Place',
-        'STM': 'Stream',
-        'STMI': 'Intermittent Stream',
-        'HLL': 'Hill',
-        'MT': 'Mountain',
-        'LK': 'Lake',
-        'RESV': 'Reservoir',
-        'ISL': 'Island',
-        'PPLA': 'Seat of a first-order administrative division',
-        'PPLA2': 'Seat of a second-order administrative division',
-        'PPLA3': 'Seat of a third-order administrative division',
-        'PPLA4': 'Seat of a fourth-order administrative division',
-        'PPLC': 'Capital of a political entity',
-    }
-    return labels.get(feature_code.strip(), None)
+    return FEATURE_CODE_LABELS.get(feature_code.strip(), None)
+
+def dump_json(obj: Any) -> bytes:
+    """Sérialise un objet en JSON compact UTF-8 (orjson si disponible)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
 
-# Lire et convertir
-locations = []
+def write_header(f, metadata: Dict[str, Any]) -> int:
+    """Écrit l'en-tête du JSON et retourne la position réservée à total_locations"""
+    total_offset = -1
+    f.write(b'{"metadata":{')
+    for i, (key, value) in enumerate(metadata.items()):
+        if i:
+            f.write(b',')
+        f.write(dump_json(key) + b':')
+        if key == 'total_locations':
+            # Le total n'est connu qu'en fin de lecture : on réserve la place
+            total_offset = f.tell()
+            f.write(TOTAL_PLACEHOLDER)
+        else:
+            f.write(dump_json(value))
+    f.write(b'},"locations":[\n')
+    return total_offset
+
+# Lire, convertir et écrire les lieux au fil de la lecture
 processed = 0
 errors = 0
+converted = 0
+
+# Statistiques supplémentaires
+feature_types = {}
+feature_codes = {}
 
 try:
-    with open(input_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
+    with open(input_file, 'r', encoding='utf-8', buffering=READ_BUFFER_SIZE) as f, \
+         open(temp_file, 'wb', buffering=WRITE_BUFFER_SIZE) as out:
+        reader = csv.reader(f)
+        
+        # Index des colonnes à partir de l'en-tête (accès positionnel par ligne)
+        header = next(reader)
+        IDX = {name: i for i, name in enumerate(header)}
+        
+        total_offset = write_header(out, {
+            'source': 'GeoNames and geographic databases',
+            'country': 'Cameroon',
+            'country_code': 'CM',
+            'total_locations': None,
+            'generated_at': datetime.now().isoformat()
+        })
         
         for line_num, row in enumerate(reader, 1):
+            if not row:
+                continue
             try:
                 location = create_location_object(row)
                 if location:
-                    locations.append(location)
+                    # Écrire le lieu immédiatement plutôt que de tout garder en mémoire
+                    if converted:
+                        out.write(b',\n')
+                    out.write(dump_json(location))
+                    converted += 1
+                    
+                    feature = location.get('feature') or _EMPTY
+                    ft = feature.get('type')
+                    fc = feature.get('code')
+                    if ft:
+                        feature_types[ft] = feature_types.get(ft, 0) + 1
+                    if fc:
+                        feature_codes[fc] = feature_codes.get(fc, 0) + 1
                 processed += 1
                 
                 if line_num % 1000 == 0:
@@ -203,27 +288,15 @@ try:
             except Exception as e:
                 errors += 1
                 print(f'Erreur à la ligne {line_num}: {e}')
+        
+        out.write(b'\n]}\n')
+        
+        # Renseigner le nombre total de lieux dans l'emplacement réservé
+        out.seek(total_offset)
+        out.write(str(converted).encode('ascii').ljust(len(TOTAL_PLACEHOLDER)))
     
-    # Créer la structure finale
-    result = {
-        'metadata': {
-            'source': 'GeoNames and geographic databases',
-            'country': 'Cameroon',
-            'country_code': 'CM',
-            'total_locations': len(locations),
-            'generated_at': None  # Sera rempli par le script
-        },
-        'locations': locations
-    }
-    
-    # Ajouter la date de génération
-    from datetime import datetime
-    result['metadata']['generated_at'] = datetime.now().isoformat()
-    
-    # Écrire le fichier JSON
-    print('\nÉcriture du fichier JSON...')
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+    # Remplacement atomique : un échec laisse l'ancien CM.json intact
+    os.replace(temp_file, output_file)
     
     # Obtenir la taille du fichier
     file_size = os.path.getsize(output_file) / (1024 * 1024)
@@ -231,21 +304,10 @@ try:
     print('\n✅ Conversion terminée!')
     print(f'- Lignes traitées: {processed}')
     print(f'- Erreurs: {errors}')
-    print(f'- Lieux convertis: {len(locations)}')
+    print(f'- Lieux convertis: {converted}')
     print(f'- Fichier créé: {output_file}')
     print(f'- Taille: {file_size:.2f} MB')
     
-    # Statistiques supplémentaires
-    feature_types = {}
-    feature_codes = {}
-    for loc in locations:
-        ft = loc.get('feature', {}).get('type')
-        fc = loc.get('feature', {}).get('code')
-        if ft:
-            feature_types[ft] = feature_types.get(ft, 0) + 1
-        if fc:
-            feature_codes[fc] = feature_codes.get(fc, 0) + 1
-    
     print('\n📊 Statistiques:')
     print(f'- Types de caractéristiques: {len(feature_types)}')
     for ft, count in sorted(feature_types.items(), key=lambda x: x[1], reverse=True)[:5]:
@@ -259,4 +321,7 @@ except Exception as e:
     import traceback
     traceback.print_exc()
     exit(1)
-
+finally:
+    # Erreur ou interruption (Ctrl+C compris) : pas de CM.json.tmp résiduel
+    if temp_file.exists():
+        temp_file.unlink()
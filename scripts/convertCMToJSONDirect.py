@@ -3,30 +3,98 @@
 
 import json
 import os
+from collections import Counter
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
+from types import MappingProxyType
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List, Tuple
+
+try:
+    import orjson  # Sérialisation JSON rapide (optionnelle)
+except ImportError:
+    orjson = None
 
 # Chemins des fichiers
 script_dir = Path(__file__).parent
 input_file = script_dir.parent / 'CM.txt'
 output_file = script_dir.parent / 'CM.json'
+# Fichier intermédiaire renommé en CM.json une fois la conversion terminée
+temp_file = script_dir.parent / 'CM.json.tmp'
+
+# Nombre de lignes converties par bloc (unité de travail des processus)
+CHUNK_SIZE = 1000
+
+# Taille minimale de CM.txt (octets) pour répartir les blocs sur plusieurs
+# processus : en dessous, le démarrage du pool coûte plus qu'il ne rapporte
+PARALLEL_MIN_BYTES = 16 << 20
 
-print('Lecture du fichier CM.txt...')
+# Tampons de lecture/écriture (1 Mo) et place réservée pour total_locations
+READ_BUFFER_SIZE = 1 << 20
+WRITE_BUFFER_SIZE = 1 << 20
+TOTAL_PLACEHOLDER = b' ' * 12
+
+# Dictionnaire vide partagé (lecture seule) pour les clés absentes
+_EMPTY = MappingProxyType({})
+
+# Labels des types et codes de caractéristiques GeoNames
+FEATURE_TYPE_LABELS = {
+    'P': 'Populated place',
+    'H': 'Hydrographic',
+    'T': 'Topographic',
+    'S': 'Spot',
+    'L': 'Area'
+}
+
+FEATURE_CODE_LABELS = {
+    'PPL': 'Populated Place',
+    'PPLA': 'Seat of a first-order administrative division',
+    'PPLA2': 'Seat of a second-order administrative division',
+    'PPLA3': 'Seat of a third-order administrative division',
+    'PPLA4': 'Seat of a fourth-order administrative division',
+    'PPLC': 'Capital of a political entity',
+    'STM': 'Stream',
+    'STMI': 'Intermittent Stream',
+    'HLL': 'Hill',
+    'MT': 'Mountain',
+    'LK': 'Lake',
+    'RESV': 'Reservoir',
+    'ISL': 'Island',
+}
 
 def clean_value(value: str) -> Any:
     """Nettoie et convertit les valeurs"""
-    if not value or value.strip() == '':
+    if not value:
         return None
     value = value.strip()
+    if not value:
+        return None
     
-    # Essayer de convertir en nombre si possible
+    # Ne tenter la conversion que si la valeur peut être un nombre, pour éviter
+    # de lever une ValueError sur chaque texte (noms alternatifs notamment)
+    first = value[0]
+    if first.isdigit() or first in '+-.':
+        try:
+            if '.' in value:
+                return float(value)
+            return int(value)
+        except ValueError:
+            pass
+    return value
+
+def parse_number(value: str) -> Any:
+    """Convertit une colonne numérique (coordonnées, population, élévation)
+
+    Chemin direct sans nettoyage préalable (int/float ignorent les espaces) ;
+    les valeurs vides ou non numériques sont traitées par clean_value.
+    """
     try:
         if '.' in value:
             return float(value)
         return int(value)
     except ValueError:
-        return value
+        return clean_value(value)
 
 def parse_alternatives(alternatives_str: str) -> List[str]:
     """Parse la chaîne d'alternatives en liste"""
@@ -35,35 +103,15 @@ def parse_alternatives(alternatives_str: str) -> List[str]:
     
     return [alt.strip() for alt in alternatives_str.split(',') if alt.strip()]
 
+@lru_cache(maxsize=None)
 def get_feature_type_label(feature_type: str) -> str:
     """Retourne le label du type de caractéristique"""
-    labels = {
-        'P': 'Populated place',
-        'H': 'Hydrographic',
-        'T': 'Topographic',
-        'S': 'Spot',
-        'L': 'Area'
-    }
-    return labels.get(feature_type.strip(), None)
+    return FEATURE_TYPE_LABELS.get(feature_type.strip(), None)
 
+@lru_cache(maxsize=None)
 def get_feature_code_label(feature_code: str) -> str:
     """Retourne le label du code de caractéristique"""
-    labels = {
-        'PPL': 'Populated Place',
-        'PPLA': 'Seat of a first-order administrative division',
-        'PPLA2': 'Seat of a second-order administrative division',
-        'PPLA3': 'Seat of a third-order administrative division',
-        'PPLA4': 'Seat of a fourth-order administrative division',
-        'PPLC': 'Capital of a political entity',
-        'STM': 'Stream',
-        'STMI': 'Intermittent Stream',
-        'HLL': 'Hill',
-        'MT': 'Mountain',
-        'LK': 'Lake',
-        'RESV': 'Reservoir',
-        'ISL': 'Island',
-    }
-    return labels.get(feature_code.strip(), None)
+    return FEATURE_CODE_LABELS.get(feature_code.strip(), None)
 
 def create_location_object(columns: List[str]) -> Dict[str, Any]:
     """Crée un objet location structuré à partir des colonnes"""
@@ -95,192 +143,279 @@ def create_location_object(columns: List[str]) -> Dict[str, Any]:
     
     # Coordonnées
     coordinates = None
-    lat = clean_value(columns[4])
-    lng = clean_value(columns[5])
+    lat = parse_number(columns[4])
+    lng = parse_number(columns[5])
     if lat is not None and lng is not None:
         coordinates = {
             'latitude': lat,
             'longitude': lng
         }
     
-    # Noms
-    name_primary = columns[1].strip() if len(columns) > 1 else ''
-    name_alternate = clean_value(columns[2]) if len(columns) > 2 else None
-    name_alternatives = parse_alternatives(columns[3]) if len(columns) > 3 else []
+    # Noms (seules les valeurs présentes sont conservées)
+    name_primary = columns[1].strip()
+    name_alternate = clean_value(columns[2])
+    name_alternatives = parse_alternatives(columns[3])
     
+    names = {'primary': name_primary}
     all_names = [name_primary]
-    if name_alternate:
-        all_names.append(name_alternate)
-    all_names.extend(name_alternatives)
-    all_names = list(set([n for n in all_names if n]))
-    
-    names = {
-        'primary': name_primary,
-        'alternate': name_alternate,
-        'alternatives': name_alternatives,
-        'all': all_names
-    }
+    if name_alternate is not None:
+        names['alternate'] = name_alternate
+        if name_alternate:
+            all_names.append(name_alternate)
+    if name_alternatives:
+        names['alternatives'] = name_alternatives
+        all_names.extend(name_alternatives)
+    all_names = list(dict.fromkeys(n for n in all_names if n))
+    if all_names:
+        names['all'] = all_names
     
     # Type géographique
-    feature_type = columns[6].strip() if len(columns) > 6 else ''
-    feature_code = columns[7].strip() if len(columns) > 7 else ''
+    feature_type = columns[6].strip()
+    feature_code = columns[7].strip()
     
-    feature = {
-        'type': feature_type or None,
-        'code': feature_code or None,
-        'type_label': get_feature_type_label(feature_type),
-        'code_label': get_feature_code_label(feature_code)
-    }
+    feature = {}
+    if feature_type:
+        feature['type'] = feature_type
+    if feature_code:
+        feature['code'] = feature_code
+    type_label = get_feature_type_label(feature_type)
+    if type_label is not None:
+        feature['type_label'] = type_label
+    code_label = get_feature_code_label(feature_code)
+    if code_label is not None:
+        feature['code_label'] = code_label
     
     # Codes administratifs
-    admin_codes = {}
-    if len(columns) > 10 and columns[10].strip():
-        admin_codes['level_1'] = columns[10].strip()
+    admin_code_1 = columns[10].strip()
     
     # Population
-    population = clean_value(columns[14]) if len(columns) > 14 else None
+    population = parse_number(columns[14])
     if population is not None and population == 0:
         population = None
     
     # Élévation
-    elevation = clean_value(columns[16]) if len(columns) > 16 else None
+    elevation = parse_number(columns[16])
     
     # Timezone
-    timezone = columns[17].strip() if len(columns) > 17 and columns[17].strip() else None
+    timezone = columns[17].strip()
     
     # Date de modification
-    modification_date = columns[18].strip() if len(columns) > 18 and columns[18].strip() else None
+    modification_date = columns[18].strip()
     
-    # Structure finale
+    # Structure finale : on n'ajoute que les clés ayant une valeur
     location = {
-        'id': columns[0].strip() if len(columns) > 0 else '',
-        'names': names,
-        'coordinates': coordinates,
-        'feature': feature,
-        'country': {
-            'code': columns[8].strip() if len(columns) > 8 else None
-        },
-        'administrative': admin_codes if admin_codes else None,
-        'elevation': {
-            'meters': elevation
-        } if elevation is not None else None,
-        'population': population,
-        'timezone': timezone,
-        'metadata': {
-            'modification_date': modification_date
-        } if modification_date else {}
+        'id': columns[0].strip(),
+        'names': names
     }
+    if coordinates is not None:
+        location['coordinates'] = coordinates
+    if feature:
+        location['feature'] = feature
+    location['country'] = {'code': columns[8].strip()}
+    if admin_code_1:
+        location['administrative'] = {'level_1': admin_code_1}
+    if elevation is not None:
+        location['elevation'] = {'meters': elevation}
+    if population is not None:
+        location['population'] = population
+    if timezone:
+        location['timezone'] = timezone
+    if modification_date:
+        location['metadata'] = {'modification_date': modification_date}
     
-    # Nettoyer les valeurs None
-    return clean_none_values(location)
+    return location
 
-def clean_none_values(obj: Any) -> Any:
-    """Supprime récursivement les valeurs None des dictionnaires"""
-    if isinstance(obj, dict):
-        cleaned = {}
-        for key, value in obj.items():
-            cleaned_value = clean_none_values(value)
-            if cleaned_value is not None:
-                cleaned[key] = cleaned_value
-        return cleaned if cleaned else None
-    elif isinstance(obj, list):
-        cleaned = [clean_none_values(item) for item in obj if clean_none_values(item) is not None]
-        return cleaned if cleaned else None
-    else:
-        return obj
+def dump_json(obj: Any) -> bytes:
+    """Sérialise un objet en JSON compact UTF-8 (orjson si disponible)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
 
-# Lire et convertir
-locations = []
-processed = 0
-errors = 0
+def write_header(f, metadata: Dict[str, Any]) -> int:
+    """Écrit l'en-tête du JSON et retourne la position réservée à total_locations"""
+    total_offset = -1
+    f.write(b'{"metadata":{')
+    for i, (key, value) in enumerate(metadata.items()):
+        if i:
+            f.write(b',')
+        f.write(dump_json(key) + b':')
+        if key == 'total_locations':
+            # Le total n'est connu qu'en fin de lecture : on réserve la place
+            total_offset = f.tell()
+            f.write(TOTAL_PLACEHOLDER)
+        else:
+            f.write(dump_json(value))
+    f.write(b'},"locations":[\n')
+    return total_offset
 
-try:
-    with open(input_file, 'r', encoding='utf-8') as f:
-        for line_num, line in enumerate(f, 1):
-            try:
-                line = line.rstrip('\n\r')
-                if not line.strip():
-                    continue
-                
-                # Séparer par tabulations
-                columns = line.split('\t')
-                
-                location = create_location_object(columns)
-                if location and location.get('id'):
-                    locations.append(location)
-                processed += 1
+def process_chunk(chunk: Tuple[int, List[str]]) -> Dict[str, Any]:
+    """Convertit un bloc de lignes (exécuté dans un processus de travail)
+
+    Retourne les lieux déjà sérialisés en JSON et les compteurs du bloc, pour
+    que le processus principal n'ait plus qu'à écrire et additionner.
+    """
+    first_line_num, lines = chunk
+    parts = []
+    error_messages = []
+    processed = 0
+    feature_types = Counter()
+    feature_codes = Counter()
+    counts = Counter()
+    
+    for line_num, line in enumerate(lines, first_line_num):
+        try:
+            line = line.rstrip('\n\r')
+            if not line.strip():
+                continue
+            
+            # Séparer par tabulations
+            columns = line.split('\t')
+            
+            location = create_location_object(columns)
+            if location and location.get('id'):
+                parts.append(dump_json(location))
                 
-                if line_num % 1000 == 0:
-                    print(f'Traité: {line_num} lignes...')
-                    
-            except Exception as e:
-                errors += 1
-                print(f'Erreur à la ligne {line_num}: {e}')
+                feature = location.get('feature') or _EMPTY
+                ft = feature.get('type')
+                fc = feature.get('code')
+                if ft:
+                    feature_types[ft] += 1
+                if fc:
+                    feature_codes[fc] += 1
+                if fc == 'PPL':
+                    counts['cities'] += 1
+                if location.get('elevation'):
+                    counts['elevation'] += 1
+                if location.get('population'):
+                    counts['population'] += 1
+            processed += 1
+            
+        except Exception as e:
+            error_messages.append(f'Erreur à la ligne {line_num}: {e}')
     
-    # Créer la structure finale
-    result = {
-        'metadata': {
-            'source': 'GeoNames and geographic databases',
-            'country': 'Cameroon',
-            'country_code': 'CM',
-            'total_locations': len(locations),
-            'generated_at': datetime.now().isoformat()
-        },
-        'locations': locations
+    return {
+        'json': b',\n'.join(parts),
+        'converted': len(parts),
+        'processed': processed,
+        'errors': error_messages,
+        'last_line_num': first_line_num + len(lines) - 1,
+        'feature_types': feature_types,
+        'feature_codes': feature_codes,
+        'counts': counts
     }
+
+def read_chunks(f) -> Iterator[Tuple[int, List[str]]]:
+    """Découpe le fichier en blocs de CHUNK_SIZE lignes numérotés"""
+    line_num = 1
+    while True:
+        lines = list(islice(f, CHUNK_SIZE))
+        if not lines:
+            return
+        yield line_num, lines
+        line_num += len(lines)
+
+def main() -> None:
+    print('Lecture du fichier CM.txt...')
     
-    # Écrire le fichier JSON
-    print('\nÉcriture du fichier JSON...')
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
-    
-    # Obtenir la taille du fichier
-    file_size = os.path.getsize(output_file) / (1024 * 1024)
-    
-    print('\n✅ Conversion terminée!')
-    print(f'- Lignes traitées: {processed}')
-    print(f'- Erreurs: {errors}')
-    print(f'- Lieux convertis: {len(locations)}')
-    print(f'- Fichier créé: {output_file}')
-    print(f'- Taille: {file_size:.2f} MB')
+    # Lire, convertir et écrire les lieux au fil de la lecture
+    processed = 0
+    errors = 0
+    converted = 0
     
     # Statistiques supplémentaires
-    feature_types = {}
-    feature_codes = {}
-    cities_count = 0
-    with_elevation = 0
-    with_population = 0
+    feature_types = Counter()
+    feature_codes = Counter()
+    counts = Counter()
     
-    for loc in locations:
-        ft = loc.get('feature', {}).get('type')
-        fc = loc.get('feature', {}).get('code')
-        if ft:
-            feature_types[ft] = feature_types.get(ft, 0) + 1
-        if fc:
-            feature_codes[fc] = feature_codes.get(fc, 0) + 1
-        if fc == 'PPL':
-            cities_count += 1
-        if loc.get('elevation'):
-            with_elevation += 1
-        if loc.get('population'):
-            with_population += 1
+    pool = None
+    last_line_num = 0
     
-    print('\n📊 Statistiques:')
-    print(f'- Villes et villages (PPL): {cities_count}')
-    print(f'- Lieux avec élévation: {with_elevation}')
-    print(f'- Lieux avec population: {with_population}')
-    print(f'- Types de caractéristiques: {len(feature_types)}')
-    for ft, count in sorted(feature_types.items(), key=lambda x: x[1], reverse=True)[:5]:
-        print(f'  • {ft}: {count}')
-    print(f'- Codes de caractéristiques: {len(feature_codes)}')
-    for fc, count in sorted(feature_codes.items(), key=lambda x: x[1], reverse=True)[:5]:
-        print(f'  • {fc}: {count}')
-    
-except Exception as e:
-    print(f'\n❌ Erreur lors de la conversion: {e}')
-    import traceback
-    traceback.print_exc()
-    exit(1)
-
-
+    try:
+        with open(input_file, 'r', encoding='utf-8', buffering=READ_BUFFER_SIZE) as f, \
+             open(temp_file, 'wb', buffering=WRITE_BUFFER_SIZE) as out:
+            
+            workers = os.cpu_count() or 1
+            if workers > 1 and os.fstat(f.fileno()).st_size >= PARALLEL_MIN_BYTES:
+                # Import différé : le chemin séquentiel ne paie pas le chargement
+                # de multiprocessing
+                from multiprocessing import Pool
+                pool = Pool(workers)
+            
+            total_offset = write_header(out, {
+                'source': 'GeoNames and geographic databases',
+                'country': 'Cameroon',
+                'country_code': 'CM',
+                'total_locations': None,
+                'generated_at': datetime.now().isoformat()
+            })
+            
+            # Les blocs sont convertis en parallèle ; imap rend les résultats dans
+            # l'ordre du fichier, ce qui conserve l'ordre des lieux dans le JSON
+            results = pool.imap(process_chunk, read_chunks(f)) if pool else map(process_chunk, read_chunks(f))
+            for result in results:
+                for message in result['errors']:
+                    print(message)
+                errors += len(result['errors'])
+                processed += result['processed']
+                
+                if result['converted']:
+                    if converted:
+                        out.write(b',\n')
+                    out.write(result['json'])
+                    converted += result['converted']
+                
+                feature_types.update(result['feature_types'])
+                feature_codes.update(result['feature_codes'])
+                counts.update(result['counts'])
+                
+                # Un message par millier de lignes franchi par le bloc, quelle que
+                # soit la valeur de CHUNK_SIZE
+                for thousand in range(last_line_num // 1000 + 1, result['last_line_num'] // 1000 + 1):
+                    print(f'Traité: {thousand * 1000} lignes...')
+                last_line_num = result['last_line_num']
+            
+            out.write(b'\n]}\n')
+            
+            # Renseigner le nombre total de lieux dans l'emplacement réservé
+            out.seek(total_offset)
+            out.write(str(converted).encode('ascii').ljust(len(TOTAL_PLACEHOLDER)))
+        
+        # Remplacement atomique : un échec laisse l'ancien CM.json intact
+        os.replace(temp_file, output_file)
+        
+        # Obtenir la taille du fichier
+        file_size = os.path.getsize(output_file) / (1024 * 1024)
+        
+        print('\n✅ Conversion terminée!')
+        print(f'- Lignes traitées: {processed}')
+        print(f'- Erreurs: {errors}')
+        print(f'- Lieux convertis: {converted}')
+        print(f'- Fichier créé: {output_file}')
+        print(f'- Taille: {file_size:.2f} MB')
+        
+        print('\n📊 Statistiques:')
+        print(f'- Villes et villages (PPL): {counts["cities"]}')
+        print(f'- Lieux avec élévation: {counts["elevation"]}')
+        print(f'- Lieux avec population: {counts["population"]}')
+        print(f'- Types de caractéristiques: {len(feature_types)}')
+        for ft, count in sorted(feature_types.items(), key=lambda x: x[1], reverse=True)[:5]:
+            print(f'  • {ft}: {count}')
+        print(f'- Codes de caractéristiques: {len(feature_codes)}')
+        for fc, count in sorted(feature_codes.items(), key=lambda x: x[1], reverse=True)[:5]:
+            print(f'  • {fc}: {count}')
+        
+    except Exception as e:
+        print(f'\n❌ Erreur lors de la conversion: {e}')
+        import traceback
+        traceback.print_exc()
+        exit(1)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        # Erreur ou interruption (Ctrl+C compris) : pas de CM.json.tmp résiduel
+        if temp_file.exists():
+            temp_file.unlink()
 
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,28 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import csv
+import mmap
 import os
+import sys
+from contextlib import ExitStack
+from itertools import islice
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+try:
+    import pyarrow as pa  # Sortie Parquet (optionnelle)
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
 
 # Chemins des fichiers
 script_dir = Path(__file__).parent
 input_file = script_dir.parent / 'CM.txt'
 output_file = script_dir.parent / 'CM.csv'
-
-print('Lecture du fichier CM.txt...')
+# Fichier intermédiaire renommé en CM.csv une fois la conversion terminée
+temp_file = script_dir.parent / 'CM.csv.tmp'
+parquet_file = script_dir.parent / 'CM.parquet'
 
 # En-têtes CSV - correspondant aux 19 colonnes du fichier original
 headers = [
@@ -33,80 +45,303 @@ headers = [
     'modification_date'
 ]
 
-processed = 0
-errors = 0
+# Progression affichée sur stderr uniquement avec --verbose
+VERBOSE = '--verbose' in sys.argv[1:]
 
-try:
-    with open(input_file, 'r', encoding='utf-8') as infile, \
-         open(output_file, 'w', encoding='utf-8', newline='') as outfile:
+# Masque de progression : un message toutes les 65 536 lignes
+PROGRESS_MASK = 0xFFFF
+
+# Nombre de lignes CSV regroupées par écriture
+BATCH_SIZE = 10_000
+
+# Taille minimale de CM.txt (octets) pour répartir la conversion sur plusieurs
+# processus : en dessous, le démarrage du pool coûte plus qu'il ne rapporte
+PARALLEL_MIN_BYTES = 16 << 20
+
+# Tampon d'écriture (1 Mo) : moins d'appels système sur le CSV de sortie
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Volume écrit (64 Mo) au-delà duquel les pages du CSV sont retirées du cache
+DROP_CACHE_BYTES = 64 << 20
+
+# Colonnes vides pour compléter une ligne courte jusqu'aux 19 colonnes d'origine
+PAD = [b''] * 19
+
+# Colonnes numériques typées une seule fois dans la sortie Parquet
+NUMERIC_TYPES = {
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'population': 'int64',
+    'elevation': 'int64',
+}
+
+# Octets imposant des guillemets (même règle que csv.writer) ; translate avec
+# SAFE_DELETE_MASK supprime tous les autres octets en un seul passage en C,
+# le résultat n'est donc non vide que si le champ doit être échappé
+QUOTE_BYTES = b',"\n\r'
+SAFE_DELETE_MASK = bytes(i for i in range(256) if i not in QUOTE_BYTES)
+
+def escape_field(value: bytes) -> bytes:
+    """Met un champ entre guillemets si nécessaire (même règle que csv.writer)"""
+    if value.translate(None, SAFE_DELETE_MASK):
+        return b'"' + value.replace(b'"', b'""') + b'"'
+    return value
+
+def format_row(row: List[bytes]) -> bytes:
+    """Assemble une ligne CSV terminée par \\r\\n (comme csv.writer)"""
+    return b','.join([escape_field(value) for value in row]) + b'\r\n'
+
+def write_parquet(csv_path: Path, parquet_path: Path) -> int:
+    """Écrit une copie colonnaire (Parquet, zstd) du CSV généré
+
+    Les colonnes non numériques restent des chaînes (codes avec zéros en tête).
+    """
+    column_types = {
+        header: pa.type_for_alias(NUMERIC_TYPES.get(header, 'string'))
+        for header in headers
+    }
+    table = pa_csv.read_csv(
+        csv_path,
+        convert_options=pa_csv.ConvertOptions(column_types=column_types)
+    )
+    pq.write_table(table, parquet_path, compression='zstd')
+    return table.num_rows
+
+def advise(fd: int, offset: int, length: int, advice: str) -> None:
+    """Transmet une indication d'accès au noyau (posix_fadvise), ignorée si indisponible"""
+    try:
+        os.posix_fadvise(fd, offset, length, getattr(os, advice))
+    except (AttributeError, OSError):
+        pass
+
+def release_written(outfile, released: int) -> int:
+    """Retire du cache les pages déjà écrites, par tranches de DROP_CACHE_BYTES
+
+    Les pages sont d'abord écrites sur disque (fdatasync) : le noyau ne retire
+    pas du cache des pages encore modifiées. Renvoie la position jusqu'à
+    laquelle les pages ont été signalées.
+    """
+    position = outfile.tell()
+    if position - released < DROP_CACHE_BYTES:
+        return released
+    outfile.flush()
+    try:
+        os.fdatasync(outfile.fileno())
+    except (AttributeError, OSError):
+        return released
+    advise(outfile.fileno(), released, position - released, 'POSIX_FADV_DONTNEED')
+    return position
+
+def convert_lines(lines: Iterable[bytes], stats: Dict[str, int],
+                  report_progress: bool = VERBOSE) -> Iterator[bytes]:
+    """Génère les lignes CSV (17 colonnes) à partir des lignes brutes de CM.txt
+
+    Les champs restent des octets : les noms UTF-8 sont recopiés tels quels,
+    sans décodage ni réencodage.
+    """
+    # Globales et méthodes liées une seule fois en variables locales
+    # (LOAD_FAST dans la boucle au lieu de LOAD_GLOBAL / LOAD_ATTR)
+    escape = escape_field
+    format_quoted = format_row
+    join_tabs = b'\t'.join
+    safe_delete_mask = SAFE_DELETE_MASK
+    pad = PAD
+    join = b','.join
+    
+    line_num = 0
+    processed = 0
+    incomplete = 0
+    for line in lines:
+        line_num += 1
         
-        writer = csv.writer(outfile)
+        # Ligne vide ou blanche : test direct, sans construire de copie nettoyée
+        if not line or line.isspace():
+            continue
+        # bytes.isspace() ne connaît que les blancs ASCII ; comme str.strip(),
+        # une ligne faite de blancs Unicode (U+00A0, U+0085, U+001C-U+001F...)
+        # est ignorée. Une ligne qui commence par un caractère ASCII visible
+        # (toutes les lignes de données) ne peut pas être blanche.
+        if not 0x21 <= line[0] <= 0x7e and not line.decode('utf-8', 'replace').strip():
+            continue
+        line = line.rstrip(b'\n\r')
         
-        # Écrire les en-têtes
-        writer.writerow(headers)
+        # Séparer par tabulations (19 champs au plus) ; une ligne courte est
+        # comptée puis complétée par des champs vides, une ligne trop longue
+        # garde ses colonnes en trop dans le dernier champ, qui est tronqué
+        columns = line.split(b'\t', 18)
+        if len(columns) < 19:
+            incomplete += 1
+            columns += pad[len(columns):]
+        elif b'\t' in columns[18]:
+            columns[18] = columns[18].split(b'\t', 1)[0]
         
-        # Lire et traiter chaque ligne
-        for line_num, line in enumerate(infile, 1):
-            try:
-                line = line.rstrip('\n\r')
-                if not line.strip():
-                    continue
-                
-                # Séparer par tabulations
-                columns = line.split('\t')
-                
-                # Le fichier original a 19 colonnes, mais certaines peuvent être vides
-                # On prend les colonnes pertinentes (17 colonnes nommées)
-                # Mapping: 0-8, 10, 14, 16, 17, 18
-                if len(columns) >= 19:
-                    # Structure: id, name_primary, name_alternate, name_alternatives, lat, lon, 
-                    # feature_type, feature_code, country, (vide), admin_code_1, (vide), (vide), (vide),
-                    # population, (vide), elevation, timezone, modification_date
-                    row = [
-                        columns[0],   # id
-                        columns[1],   # name_primary
-                        columns[2],   # name_alternate
-                        columns[3],   # name_alternatives
-                        columns[4],   # latitude
-                        columns[5],   # longitude
-                        columns[6],   # feature_type
-                        columns[7],   # feature_code
-                        columns[8],   # country_code
-                        columns[10] if len(columns) > 10 else '',  # admin_code_1
-                        '',           # admin_code_2
-                        '',           # admin_code_3
-                        '',           # admin_code_4
-                        columns[14] if len(columns) > 14 else '',  # population
-                        columns[16] if len(columns) > 16 else '',   # elevation
-                        columns[17] if len(columns) > 17 else '',   # timezone
-                        columns[18] if len(columns) > 18 else ''    # modification_date
-                    ]
-                else:
-                    # Fallback: prendre les colonnes disponibles
-                    while len(columns) < 17:
-                        columns.append('')
-                    row = columns[:17]
-                writer.writerow(row)
+        # Le fichier original a 19 colonnes, mais certaines peuvent être vides
+        # On prend les colonnes pertinentes (17 colonnes nommées)
+        # Mapping: 0-8, 10, 14, 16, 17, 18
+        # Structure: id, name_primary, name_alternate, name_alternatives, lat, lon, 
+        # feature_type, feature_code, country, (vide), admin_code_1, (vide), (vide), (vide),
+        # population, (vide), elevation, timezone, modification_date
+        
+        row = [
+            columns[0],   # id
+            columns[1],   # name_primary
+            columns[2],   # name_alternate
+            columns[3],   # name_alternatives
+            columns[4],   # latitude
+            columns[5],   # longitude
+            columns[6],   # feature_type
+            columns[7],   # feature_code
+            columns[8],   # country_code
+            columns[10],  # admin_code_1
+            b'',          # admin_code_2
+            b'',          # admin_code_3
+            b'',          # admin_code_4
+            columns[14],  # population
+            columns[16],  # elevation
+            columns[17],  # timezone
+            columns[18]   # modification_date
+        ]
+        
+        processed += 1
+        
+        if report_progress and (line_num & PROGRESS_MASK) == 0:
+            print(f'Traité: {line_num} lignes...', file=sys.stderr)
+            
+        # Une ligne brute sans virgule, guillemet ni retour chariot n'a aucun
+        # champ à échapper : jointure directe
+        if not line.translate(None, safe_delete_mask):
+            yield join(row) + b'\r\n'
+        # Cas courant : seuls les noms (colonnes 1 à 3) sont concernés ; les
+        # autres champs, sans tabulation, sont contrôlés en un seul passage
+        elif not (row[0].translate(None, safe_delete_mask)
+                  or join_tabs(row[4:]).translate(None, safe_delete_mask)):
+            row[1] = escape(row[1])
+            row[2] = escape(row[2])
+            row[3] = escape(row[3])
+            yield join(row) + b'\r\n'
+        # Sinon, chaque champ passe par escape_field (même règle que csv.writer)
+        else:
+            yield format_quoted(row)
+    
+    stats['processed'] += processed
+    stats['incomplete'] += incomplete
+
+def split_ranges(mm: mmap.mmap, parts: int) -> List[Tuple[int, int]]:
+    """Découpe le fichier en `parts` tranches d'octets alignées sur les fins de ligne"""
+    size = len(mm)
+    ranges = []
+    start = 0
+    for i in range(1, parts + 1):
+        if i == parts:
+            end = size
+        else:
+            end = mm.find(b'\n', max(start, size * i // parts))
+            end = size if end == -1 else end + 1
+        if end > start:
+            ranges.append((start, end))
+        start = end
+    return ranges
+
+def convert_range(task: Tuple[Path, int, int]) -> Tuple[bytes, Dict[str, int]]:
+    """Convertit une tranche [start, end) de CM.txt dans un processus de travail
+
+    Renvoie le bloc CSV déjà formaté et les compteurs de la tranche.
+    """
+    path, start, end = task
+    stats = {'processed': 0, 'incomplete': 0}
+    with open(path, 'rb') as infile, \
+         mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        lines = mm[start:end].split(b'\n')
+    return b''.join(convert_lines(lines, stats, report_progress=False)), stats
+
+def main() -> Dict[str, int]:
+    """Convertit CM.txt en CM.csv et renvoie les compteurs de lignes"""
+    print('Lecture du fichier CM.txt...')
+    
+    stats = {'processed': 0, 'incomplete': 0}
+    
+    try:
+        with open(input_file, 'rb') as infile, \
+             ExitStack() as stack, \
+             open(temp_file, 'wb', buffering=WRITE_BUFFER_SIZE) as outfile:
+            
+            # mmap refuse un fichier vide : CM.txt vide donne un CSV réduit à l'en-tête
+            mm = None
+            if os.fstat(infile.fileno()).st_size > 0:
+                mm = stack.enter_context(
+                    mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+                )
                 
-                processed += 1
+                # Lecture séquentielle : le noyau peut lire en avance
+                try:
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                except (AttributeError, OSError):
+                    pass
+            
+            # Écrire les en-têtes
+            outfile.write(format_row([header.encode('utf-8') for header in headers]))
+            released = 0
+            
+            workers = os.cpu_count() or 1
+            if mm is not None and workers > 1 and len(mm) >= PARALLEL_MIN_BYTES:
+                # Une tranche par processus ; imap rend les blocs dans l'ordre
+                # du fichier, ce qui conserve l'ordre des lignes du CSV
+                # Import différé : le chemin séquentiel ne paie pas le chargement
+                # de multiprocessing (~15 ms)
+                from multiprocessing import Pool
                 
-                if line_num % 1000 == 0:
-                    print(f'Traité: {line_num} lignes...')
-                    
-            except Exception as e:
-                errors += 1
-                print(f'Erreur à la ligne {line_num}: {e}')
-    
-    # Obtenir la taille du fichier
-    file_size = os.path.getsize(output_file) / (1024 * 1024)
+                tasks = [(input_file, start, end) for start, end in split_ranges(mm, workers)]
+                with Pool(workers) as pool:
+                    for block, block_stats in pool.imap(convert_range, tasks):
+                        outfile.write(block)
+                        released = release_written(outfile, released)
+                        for key, value in block_stats.items():
+                            stats[key] += value
+                        if VERBOSE:
+                            print(f'Traité: {stats["processed"]} lignes...', file=sys.stderr)
+            else:
+                # Les lignes converties sont regroupées par lots de BATCH_SIZE :
+                # un seul b''.join et un seul write par lot
+                lines = convert_lines(iter(mm.readline, b'') if mm is not None else (), stats)
+                while True:
+                    batch = b''.join(islice(lines, BATCH_SIZE))
+                    if not batch:
+                        break
+                    outfile.write(batch)
+                    released = release_written(outfile, released)
+        
+        # Remplacement atomique : CM.csv n'est jamais laissé à moitié écrit
+        os.replace(temp_file, output_file)
+        
+        # Obtenir la taille du fichier
+        file_size = os.path.getsize(output_file) / (1024 * 1024)
+        
+        print('\n✅ Conversion terminée!')
+        print(f'- Lignes traitées: {stats["processed"]}')
+        print(f'- Lignes incomplètes: {stats["incomplete"]}')
+        print(f'- Fichier créé: {output_file}')
+        print(f'- Taille: {file_size:.2f} MB')
+        
+    except Exception as e:
+        print(f'\n❌ Erreur lors de la conversion: {e}')
+        exit(1)
+    finally:
+        # Erreur ou interruption (Ctrl+C compris) : pas de CM.csv.tmp résiduel
+        if temp_file.exists():
+            temp_file.unlink()
     
-    print('\n✅ Conversion terminée!')
-    print(f'- Lignes traitées: {processed}')
-    print(f'- Erreurs: {errors}')
-    print(f'- Fichier créé: {output_file}')
-    print(f'- Taille: {file_size:.2f} MB')
+    # Copie Parquet optionnelle : un échec n'invalide pas CM.csv, déjà écrit
+    if pa is not None:
+        try:
+            parquet_rows = write_parquet(output_file, parquet_file)
+            parquet_size = os.path.getsize(parquet_file) / (1024 * 1024)
+            print(f'- Fichier Parquet créé: {parquet_file} ({parquet_rows} lignes, {parquet_size:.2f} MB)')
+        except Exception as e:
+            print(f'⚠️ Copie Parquet non créée: {e}')
+            if parquet_file.exists():
+                parquet_file.unlink()
     
-except Exception as e:
-    print(f'\n❌ Erreur lors de la conversion: {e}')
-    exit(1)
+    return stats
 
+if __name__ == '__main__':
+    main()